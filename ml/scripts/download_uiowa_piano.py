@@ -1,10 +1,42 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
 BASE = "https://theremin.music.uiowa.edu"
 PAGE = f"{BASE}/MISpiano.html"
+CHUNK_BYTES = 1 << 20
+
+
+def make_session(pool_size: int = 8) -> requests.Session:
+    # Every sample lives on one host, so a single keep-alive pool avoids a TLS handshake per file.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=3)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download_to(session: requests.Session, url: str, target: Path) -> None:
+    # Stream to a .part file and rename on success so interrupted runs never leave a truncated sample.
+    tmp = target.with_name(target.name + ".part")
+    with session.get(url, timeout=60, stream=True) as resp:
+        resp.raise_for_status()
+        with tmp.open("wb") as f:
+            for chunk in resp.iter_content(chunk_size=CHUNK_BYTES):
+                f.write(chunk)
+    tmp.replace(target)
+
+
+def download_one(session: requests.Session, url: str, out_dir: Path) -> str:
+    name = url.split("/")[-1]
+    target = out_dir / name
+    if target.exists() and target.stat().st_size > 0:
+        return f"exists {name}"
+    download_to(session, url, target)
+    return f"download {name}"
 
 
 def discover_links(session: requests.Session):
@@ -31,12 +63,14 @@ def main():
     parser = argparse.ArgumentParser(description="Download public piano note samples from University of Iowa")
     parser.add_argument("--out", default="ml/data/raw/piano/uiowa", help="Output folder")
     parser.add_argument("--limit", type=int, default=60, help="Max number of files to download")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent downloads")
     args = parser.parse_args()
 
     out_dir = Path(args.out)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    with requests.Session() as s:
+    workers = max(1, args.workers)
+    with make_session(pool_size=workers) as s:
         urls = discover_links(s)
         if not urls:
             raise RuntimeError("No sample links discovered from source page")
@@ -44,17 +78,10 @@ def main():
         selected = urls[: args.limit]
         print(f"Discovered {len(urls)} links, downloading {len(selected)}")
 
-        for idx, url in enumerate(selected, start=1):
-            name = url.split("/")[-1]
-            target = out_dir / name
-            if target.exists() and target.stat().st_size > 0:
-                print(f"[{idx}/{len(selected)}] exists {name}")
-                continue
-
-            print(f"[{idx}/{len(selected)}] download {name}")
-            resp = s.get(url, timeout=60)
-            resp.raise_for_status()
-            target.write_bytes(resp.content)
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(download_one, s, url, out_dir): url for url in selected}
+            for idx, fut in enumerate(as_completed(futures), start=1):
+                print(f"[{idx}/{len(selected)}] {fut.result()}")
 
     print(f"Done. Files in: {out_dir}")
 
@@ -3,8 +3,9 @@ from pathlib import Path
 import joblib
 import numpy as np
 import yaml
+from joblib import Parallel, delayed
 
-from model_utils import apply_platt, featurize, featurize_waveform
+from model_utils import FEATURE_VERSION, apply_platt, featurize, featurize_cached, featurize_waveform
 from model_utils_v2 import featurize_v2
 from model_utils_v2 import featurize_v2_waveform
 from model_utils_v3 import featurize_v3, featurize_v3_waveform
@@ -14,9 +15,22 @@ def load_model_pack(model_path: str | Path) -> dict:
     pack = joblib.load(model_path)
     if not isinstance(pack, dict):
         raise RuntimeError(f"Unsupported model pack format: {model_path}")
+    check_feature_version(pack, model_path)
     return pack
 
 
+def check_feature_version(pack: dict, source: str | Path = "model pack") -> None:
+    if feature_mode_from_pack(pack) != "baseline_v1":
+        return
+    # Packs written before the version was recorded were trained on the v1 feature definition.
+    version = int(pack.get("feature_version", 1))
+    if version != FEATURE_VERSION:
+        raise RuntimeError(
+            f"{source} was trained on baseline features v{version} but this code computes "
+            f"v{FEATURE_VERSION}; retrain it with train_baseline.py"
+        )
+
+
 def load_effective_config(pack: dict, config_path: str | Path | None = None) -> dict:
     file_cfg = None
     if config_path is not None:
@@ -25,6 +39,9 @@ def load_effective_config(pack: dict, config_path: str | Path | None = None) ->
     if isinstance(pack_cfg, dict):
         merged = dict(file_cfg or {})
         merged.update(pack_cfg)
+        # Packs trained before the key existed used full-rate ZCR/RMS; never take it from the file.
+        if "time_feature_decimation" not in pack_cfg:
+            merged["time_feature_decimation"] = 1
         return merged
     if file_cfg is None:
         raise RuntimeError("config path is required when model pack does not embed config")
@@ -35,9 +52,18 @@ def feature_mode_from_pack(pack: dict) -> str:
     return str(pack.get("feature_mode", "baseline_v1")).strip().lower()
 
 
-def featurize_for_pack(audio_path: str, pack: dict, cfg: dict) -> np.ndarray:
-    mode = feature_mode_from_pack(pack)
+def featurize_for_pack(
+    audio_path: str, pack: dict, cfg: dict, feature_cache_dir: str | Path | None = None
+) -> np.ndarray:
+    return featurize_for_mode(audio_path, feature_mode_from_pack(pack), cfg, feature_cache_dir)
+
+
+def featurize_for_mode(
+    audio_path: str, mode: str, cfg: dict, feature_cache_dir: str | Path | None = None
+) -> np.ndarray:
     if mode == "baseline_v1":
+        if feature_cache_dir:
+            return featurize_cached(audio_path, cfg, feature_cache_dir)
         return featurize(audio_path, cfg)
     if mode == "rich_v2":
         return featurize_v2(audio_path, cfg)
@@ -83,6 +109,7 @@ def calibrate_probabilities(raw_prob: np.ndarray, pack: dict) -> np.ndarray:
 def _normalize_member(member: dict) -> dict:
     normalized = dict(member)
     if isinstance(normalized.get("pack"), dict):
+        check_feature_version(normalized["pack"], normalized.get("model_path") or "ensemble member pack")
         return normalized
     model_path = normalized.get("model_path")
     if not model_path:
@@ -110,17 +137,19 @@ def _aggregate_member_probs(member_probs: list[tuple[float, float]], pack: dict)
     return raw_prob, prob
 
 
-def predict_probability(audio_path: str, pack: dict, cfg: dict | None) -> tuple[float, float]:
+def predict_probability(
+    audio_path: str, pack: dict, cfg: dict | None, feature_cache_dir: str | Path | None = None
+) -> tuple[float, float]:
     if feature_mode_from_pack(pack) == "ensemble_v1":
         members = [_normalize_member(member) for member in pack.get("members", [])]
         member_probs = []
         for member in members:
             member_pack = member["pack"]
             member_cfg = load_effective_config(member_pack, member.get("config_path"))
-            member_probs.append(predict_probability(audio_path, member_pack, member_cfg))
+            member_probs.append(predict_probability(audio_path, member_pack, member_cfg, feature_cache_dir))
         return _aggregate_member_probs(member_probs, pack)
     model = pack["model"]
-    x = featurize_for_pack(audio_path, pack, cfg).reshape(1, -1)
+    x = featurize_for_pack(audio_path, pack, cfg, feature_cache_dir).reshape(1, -1)
     raw_prob = float(model.predict_proba(x)[0, 1])
     prob = float(calibrate_probabilities(np.array([raw_prob]), pack)[0])
     return raw_prob, prob
@@ -142,6 +171,63 @@ def predict_probability_waveform(y: np.ndarray, sr: int, pack: dict, cfg: dict |
     return raw_prob, prob
 
 
+def _featurize_for_mode_safe(
+    audio_path: str, mode: str, cfg: dict, feature_cache_dir: str | Path | None
+) -> tuple[np.ndarray | None, str]:
+    try:
+        return featurize_for_mode(audio_path, mode, cfg, feature_cache_dir), ""
+    except Exception as ex:
+        return None, str(ex)
+
+
+def predict_probabilities(
+    audio_paths: list[str],
+    pack: dict,
+    cfg: dict | None,
+    feature_cache_dir: str | Path | None = None,
+    n_jobs: int = 1,
+) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """Batch version of predict_probability: parallel featurization, one predict_proba call.
+
+    Returns (raw, calibrated, errors); files that fail to featurize get NaN probabilities and a
+    non-empty error string instead of aborting the batch.
+    """
+    n = len(audio_paths)
+    raw = np.full(n, np.nan, dtype=np.float64)
+    prob = np.full(n, np.nan, dtype=np.float64)
+    errors = [""] * n
+    if feature_mode_from_pack(pack) == "ensemble_v1":
+        members = [_normalize_member(member) for member in pack.get("members", [])]
+        member_results = []
+        for member in members:
+            member_pack = member["pack"]
+            member_cfg = load_effective_config(member_pack, member.get("config_path"))
+            member_results.append(
+                predict_probabilities(audio_paths, member_pack, member_cfg, feature_cache_dir, n_jobs)
+            )
+        for i in range(n):
+            member_errors = [r[2][i] for r in member_results if r[2][i]]
+            if member_errors:
+                errors[i] = member_errors[0]
+                continue
+            raw[i], prob[i] = _aggregate_member_probs([(float(r[0][i]), float(r[1][i])) for r in member_results], pack)
+        return raw, prob, errors
+
+    mode = feature_mode_from_pack(pack)
+    feats = Parallel(n_jobs=n_jobs, backend="loky")(
+        delayed(_featurize_for_mode_safe)(p, mode, cfg, feature_cache_dir) for p in audio_paths
+    )
+    ok = [i for i, (feat, _) in enumerate(feats) if feat is not None]
+    for i, (feat, err) in enumerate(feats):
+        if feat is None:
+            errors[i] = err
+    if ok:
+        raw_ok = pack["model"].predict_proba(np.vstack([feats[i][0] for i in ok]))[:, 1]
+        raw[ok] = raw_ok
+        prob[ok] = calibrate_probabilities(raw_ok, pack)
+    return raw, prob, errors
+
+
 def decision_threshold_from_pack(pack: dict) -> float:
     return float(pack.get("decision_threshold", 0.5))
 
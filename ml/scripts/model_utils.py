@@ -1,9 +1,15 @@
+import functools
+import hashlib
+import json
 import math
+import os
 import re
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import librosa
 import numpy as np
+import soundfile as sf
 from sklearn.metrics import (
     average_precision_score,
     classification_report,
@@ -11,45 +17,307 @@ from sklearn.metrics import (
     roc_auc_score,
     roc_curve,
 )
+from scipy.signal import decimate
 from sklearn.model_selection import GroupShuffleSplit, train_test_split
 
+if TYPE_CHECKING:
+    import torch
+
+
+# Bump whenever featurize_waveform output changes: stale on-disk feature caches are ignored and
+# baseline packs trained on another version are refused at load (see inference_utils).
+FEATURE_VERSION = 2
+# 5 log-mel stats + mean/std of centroid, rolloff, ZCR, RMS + peak amplitude.
+BASELINE_FEATURE_DIM = 14
+FEATURE_CFG_KEYS = (
+    "sample_rate",
+    "n_mels",
+    "hop_length",
+    "n_fft",
+    "max_duration_seconds",
+    "time_feature_decimation",
+)
+
+
+# Compressed formats libsndfile cannot decode; these still go through librosa/audioread.
+LIBROSA_ONLY_SUFFIXES = (".mp3", ".m4a", ".aac", ".wma")
+
+
+def load_audio(path: str, cfg: dict) -> tuple[np.ndarray, int]:
+    sr = int(cfg["sample_rate"])
+    duration = cfg.get("max_duration_seconds")
+    if not str(path).lower().endswith(LIBROSA_ONLY_SUFFIXES):
+        try:
+            with sf.SoundFile(path) as f:
+                file_sr = int(f.samplerate)
+                frames = int(duration * file_sr) if duration else -1
+                data = f.read(frames=frames, dtype="float32", always_2d=True)
+        except RuntimeError:
+            data = None
+        if data is not None:
+            y = data.mean(axis=1)
+            if file_sr != sr:
+                y = librosa.resample(y, orig_sr=file_sr, target_sr=sr, res_type="soxr_hq")
+            return np.asarray(y, dtype=np.float32), sr
+    y, sr = librosa.load(path, sr=sr, mono=True, duration=duration)
+    return np.asarray(y, dtype=np.float32), int(sr)
+
 
 def featurize(path: str, cfg: dict) -> np.ndarray:
-    y, sr = librosa.load(path, sr=cfg["sample_rate"], mono=True, duration=cfg["max_duration_seconds"])
+    y, sr = load_audio(path, cfg)
     return featurize_waveform(y, sr, cfg)
 
 
+def feature_cfg_key(cfg: dict) -> str:
+    payload = {k: cfg.get(k) for k in FEATURE_CFG_KEYS}
+    payload["feature_version"] = FEATURE_VERSION
+    return hashlib.md5(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def feature_cache_path(path: str, cfg: dict, cache_dir: str | Path) -> Path:
+    st = os.stat(path)
+    entry = f"{Path(path).resolve()}|{st.st_mtime_ns}|{st.st_size}"
+    return Path(cache_dir) / feature_cfg_key(cfg) / f"{hashlib.md5(entry.encode('utf-8')).hexdigest()}.npy"
+
+
+def load_cached_features(path: str, cfg: dict, cache_dir: str | Path) -> np.ndarray | None:
+    cache_path = feature_cache_path(path, cfg, cache_dir)
+    if not cache_path.exists():
+        return None
+    try:
+        return np.load(cache_path)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_features(path: str, cfg: dict, cache_dir: str | Path, feats: np.ndarray) -> None:
+    cache_path = feature_cache_path(path, cfg, cache_dir)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write-then-rename keeps concurrent workers from reading a half-written entry.
+    tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp.npy")
+    np.save(tmp_path, feats)
+    os.replace(tmp_path, cache_path)
+
+
+def featurize_cached(path: str, cfg: dict, cache_dir: str | Path) -> np.ndarray:
+    feats = load_cached_features(path, cfg, cache_dir)
+    if feats is None:
+        feats = featurize(path, cfg)
+        save_cached_features(path, cfg, cache_dir, feats)
+    return feats
+
+
+@functools.lru_cache(maxsize=8)
+def _mel_basis(sr: int, n_fft: int, n_mels: int) -> np.ndarray:
+    basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels, dtype=np.float32)
+    basis.flags.writeable = False
+    return basis
+
+
+def power_spectrogram(y: np.ndarray, cfg: dict) -> np.ndarray:
+    n_fft = int(cfg["n_fft"])
+    hop_length = int(cfg["hop_length"])
+    return np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length)) ** 2
+
+
+# librosa zero_crossing_rate/rms framing at full rate; scaled down with the decimation factor.
+_FRAME_LENGTH = 2048
+_FRAME_HOP = 512
+
+
+def time_feature_signal(y: np.ndarray, cfg: dict) -> tuple[np.ndarray, int, int]:
+    """Signal and (frame_length, hop_length) used for ZCR/RMS.
+
+    ZCR/RMS only feed mean/std aggregates, so `time_feature_decimation` lets them run on a
+    polyphase-decimated copy. Frames shrink by the same factor to keep their time span.
+    The anti-alias low-pass drops content above the new Nyquist, so RMS and ZCR on broadband
+    clips are lower than at full rate; only enable it for packs trained with the same factor.
+    """
+    q = max(1, int(cfg.get("time_feature_decimation", 1)))
+    if q == 1:
+        return y, _FRAME_LENGTH, _FRAME_HOP
+    y_lo = decimate(y, q, ftype="fir", zero_phase=True).astype(np.float32, copy=False)
+    return y_lo, _FRAME_LENGTH // q, _FRAME_HOP // q
+
+
 def featurize_waveform(y: np.ndarray, sr: int, cfg: dict) -> np.ndarray:
     y = np.asarray(y, dtype=np.float32)
     if y.size == 0:
-        return np.zeros(13, dtype=np.float32)
-
-    mel = librosa.feature.melspectrogram(
-        y=y,
-        sr=sr,
-        n_fft=cfg["n_fft"],
-        hop_length=cfg["hop_length"],
-        n_mels=cfg["n_mels"],
-        power=2.0,
-    )
-    logmel = librosa.power_to_db(mel + 1e-10)
-    feats = [
-        float(np.mean(logmel)),
-        float(np.std(logmel)),
-        float(np.percentile(logmel, 10)),
-        float(np.percentile(logmel, 50)),
-        float(np.percentile(logmel, 90)),
-    ]
-    centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
-    rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)
-    zcr = librosa.feature.zero_crossing_rate(y)
-    rms = librosa.feature.rms(y=y)
-    for arr in (centroid, rolloff, zcr, rms):
-        feats.append(float(np.mean(arr)))
-        feats.append(float(np.std(arr)))
-    # A simple robustness feature for near-silence or heavily compressed clips.
-    feats.append(float(np.max(np.abs(y))))
-    return np.array(feats, dtype=np.float32)
+        return np.zeros(BASELINE_FEATURE_DIM, dtype=np.float32)
+
+    n_fft = int(cfg["n_fft"])
+    hop_length = int(cfg["hop_length"])
+    # One STFT feeds the mel stats and both spectral shape features.
+    S = power_spectrogram(y, cfg)
+    S = S.astype(np.float32, copy=False)
+    mel = _mel_basis(int(sr), n_fft, int(cfg["n_mels"])) @ S
+    # Inline power_to_db(mel + 1e-10) (ref=1, amin=1e-10, top_db=80) done in place so the
+    # log-mel stays float32 instead of bouncing through float64 temporaries.
+    logmel = np.add(mel, 1e-10, out=mel)
+    np.maximum(logmel, 1e-10, out=logmel)
+    np.log10(logmel, out=logmel)
+    logmel *= 10.0
+    np.maximum(logmel, logmel.max() - 80.0, out=logmel)
+    mag = np.sqrt(S)
+    centroid = librosa.feature.spectral_centroid(S=mag, sr=sr, n_fft=n_fft, hop_length=hop_length)
+    rolloff = librosa.feature.spectral_rolloff(S=mag, sr=sr, n_fft=n_fft, hop_length=hop_length)
+    y_time, frame_length, frame_hop = time_feature_signal(y, cfg)
+    zcr = librosa.feature.zero_crossing_rate(y_time, frame_length=frame_length, hop_length=frame_hop)
+    # Keep ZCR in crossings per full-rate sample so it does not scale with the decimation factor.
+    zcr *= frame_length / _FRAME_LENGTH
+    rms = librosa.feature.rms(y=y_time, frame_length=frame_length, hop_length=frame_hop)
+
+    # Centroid/rolloff share STFT framing and ZCR/RMS share time framing, so each pair reduces in one call.
+    spectral = np.concatenate([centroid, rolloff], axis=0)
+    temporal = np.concatenate([zcr, rms], axis=0)
+    frame_stats = np.empty(8, dtype=np.float64)
+    frame_stats[0:4:2] = spectral.mean(axis=1)
+    frame_stats[1:4:2] = spectral.std(axis=1)
+    frame_stats[4::2] = temporal.mean(axis=1)
+    frame_stats[5::2] = temporal.std(axis=1)
+    return np.concatenate(
+        [
+            [logmel.mean(), logmel.std()],
+            np.percentile(logmel, [10, 50, 90]),
+            frame_stats,
+            # A simple robustness feature for near-silence or heavily compressed clips.
+            [np.abs(y).max()],
+        ]
+    ).astype(np.float32)
+
+
+_ROLL_PERCENT = 0.85
+_ZCR_THRESHOLD = 1e-10
+
+
+@functools.lru_cache(maxsize=8)
+def _torch_device_consts(sr: int, n_fft: int, n_mels: int, device: str) -> tuple["torch.Tensor", "torch.Tensor"]:
+    import torch
+    import torchaudio
+
+    window = torch.hann_window(n_fft, device=device)
+    fbank = torchaudio.functional.melscale_fbanks(
+        n_freqs=n_fft // 2 + 1,
+        f_min=0.0,
+        f_max=sr / 2.0,
+        n_mels=n_mels,
+        sample_rate=sr,
+        norm="slaney",
+        mel_scale="slaney",
+    ).to(device)
+    return window, fbank
+
+
+def _frames_valid_mask(n_valid: "torch.Tensor", n_frames: int) -> "torch.Tensor":
+    import torch
+
+    return torch.arange(n_frames, device=n_valid.device)[None, :] < n_valid[:, None]
+
+
+def _masked_mean_std(arr: "torch.Tensor", mask: "torch.Tensor") -> tuple["torch.Tensor", "torch.Tensor"]:
+    count = mask.sum(dim=-1).clamp(min=1)
+    mean = (arr * mask).sum(dim=-1) / count
+    var = (((arr - mean[:, None]) ** 2) * mask).sum(dim=-1) / count
+    return mean, var.sqrt()
+
+
+def featurize_waveforms_batch(waveforms: list[np.ndarray], sr: int, cfg: dict, device: str = "cuda") -> np.ndarray:
+    """Batched featurize_waveform on a torch device.
+
+    Waveforms are zero-padded to a common length and every frame-level statistic is masked to
+    each clip's own frame count, so rows match featurize_waveform up to float tolerance.
+    """
+    n_fft = int(cfg["n_fft"])
+    hop = int(cfg["hop_length"])
+    n_mels = int(cfg["n_mels"])
+    # torch is imported here rather than at module scope so the per-file CPU path (and every
+    # script importing this module) does not pay its multi-second import cost.
+    try:
+        import torch
+
+        window, fbank = _torch_device_consts(int(sr), n_fft, n_mels, str(device))
+    except ImportError as ex:
+        raise RuntimeError("Batched featurization requires torch and torchaudio") from ex
+
+    out = np.zeros((len(waveforms), BASELINE_FEATURE_DIM), dtype=np.float32)
+    keep = [i for i, w in enumerate(waveforms) if np.asarray(w).size > 0]
+    if not keep:
+        return out
+
+    clips = [np.asarray(waveforms[i], dtype=np.float32) for i in keep]
+    lengths = torch.tensor([c.size for c in clips], device=device)
+
+    with torch.no_grad():
+        batch = torch.nn.utils.rnn.pad_sequence([torch.from_numpy(c) for c in clips], batch_first=True).to(device)
+
+        # One power STFT feeds the log-mel stats and both spectral shape features.
+        power = (
+            torch.stft(
+                batch,
+                n_fft=n_fft,
+                hop_length=hop,
+                window=window,
+                center=True,
+                pad_mode="constant",
+                return_complex=True,
+            ).abs()
+            ** 2
+        )
+        mel = torch.einsum("fm,bft->bmt", fbank, power)
+        logmel = 10.0 * torch.log10(torch.clamp(mel + 1e-10, min=1e-10))
+        spec_frames = 1 + lengths // hop
+        q = torch.tensor([0.1, 0.5, 0.9], device=device, dtype=logmel.dtype)
+        mel_stats = []
+        for b in range(len(clips)):
+            row = logmel[b, :, : int(spec_frames[b])].reshape(-1)
+            # Same top_db=80 floor librosa.power_to_db applies per clip.
+            row = torch.maximum(row, row.max() - 80.0)
+            mel_stats.append(torch.cat([row.mean()[None], row.std(correction=0)[None], torch.quantile(row, q)]))
+        mel_stats = torch.stack(mel_stats)
+
+        mag = power.sqrt()
+        freqs = torch.linspace(0.0, sr / 2.0, n_fft // 2 + 1, device=device)
+        total = mag.sum(dim=1)
+        tiny = torch.finfo(mag.dtype).tiny
+        centroid = torch.where(
+            total > tiny,
+            (freqs[None, :, None] * mag).sum(dim=1) / total.clamp(min=tiny),
+            torch.zeros_like(total),
+        )
+        cumulative = torch.cumsum(mag, dim=1)
+        below = (cumulative < _ROLL_PERCENT * cumulative[:, -1:, :]).sum(dim=1)
+        rolloff = freqs[below.clamp(max=freqs.numel() - 1)]
+        spec_mask = _frames_valid_mask(spec_frames, centroid.shape[-1]).to(batch.dtype)
+
+        # RMS over zero-padded frames, ZCR over edge-padded frames (librosa conventions).
+        time_signals = [time_feature_signal(c, cfg) for c in clips]
+        time_clips = [t[0] for t in time_signals]
+        frame_length, frame_hop = time_signals[0][1], time_signals[0][2]
+        time_lengths = torch.tensor([c.size for c in time_clips], device=device)
+        half = frame_length // 2
+        time_batch = torch.nn.utils.rnn.pad_sequence(
+            [torch.from_numpy(c) for c in time_clips], batch_first=True
+        ).to(device)
+        rms_frames = torch.nn.functional.pad(time_batch, (half, half)).unfold(-1, frame_length, frame_hop)
+        rms = (rms_frames**2).mean(dim=-1).sqrt()
+        edge = torch.nn.utils.rnn.pad_sequence(
+            [torch.from_numpy(np.pad(c, half, mode="edge")) for c in time_clips], batch_first=True
+        ).to(device)
+        zcr_frames = edge.unfold(-1, frame_length, frame_hop)
+        zcr_frames = torch.where(zcr_frames.abs() <= _ZCR_THRESHOLD, torch.zeros_like(zcr_frames), zcr_frames)
+        signs = torch.signbit(zcr_frames)
+        zcr = (signs[..., 1:] != signs[..., :-1]).sum(dim=-1).to(batch.dtype) / _FRAME_LENGTH
+        frame_mask = _frames_valid_mask(1 + time_lengths // frame_hop, rms.shape[-1]).to(batch.dtype)
+
+        cols = [mel_stats]
+        for arr, mask in ((centroid, spec_mask), (rolloff, spec_mask), (zcr, frame_mask), (rms, frame_mask)):
+            mean, std = _masked_mean_std(arr, mask)
+            cols.append(torch.stack([mean, std], dim=1))
+        cols.append(batch.abs().max(dim=1).values[:, None])
+        feats = torch.cat(cols, dim=1).cpu().numpy().astype(np.float32)
+
+    out[keep] = feats
+    return out
 
 
 def source_group_key(path: str) -> str:
@@ -1,25 +1,69 @@
 import argparse
+import glob
+import os
+import sys
 
-from inference_utils import decision_threshold_from_pack, load_effective_config, load_model_pack, predict_probability
+from inference_utils import decision_threshold_from_pack, load_effective_config, load_model_pack, predict_probabilities
+
+AUDIO_EXTS = (".wav", ".mp3", ".m4a", ".aac", ".wma", ".flac", ".aiff", ".aif")
+# Each loky worker re-imports librosa and the feature modules (seconds), while one clip featurizes
+# in tens of milliseconds, so smaller batches are faster run serially.
+PARALLEL_MIN_FILES = 128
+
+
+def expand_audio_paths(patterns: list[str]) -> list[str]:
+    # Expand globs here too: Windows shells pass wildcards through unexpanded.
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if any(ch in pattern for ch in "*?[") else [pattern]
+        for match in matches:
+            if os.path.isdir(match):
+                for dirpath, _, filenames in sorted(os.walk(match)):
+                    paths.extend(
+                        os.path.join(dirpath, fn) for fn in sorted(filenames) if fn.lower().endswith(AUDIO_EXTS)
+                    )
+            else:
+                paths.append(match)
+    return paths
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Run baseline model on one audio file")
-    parser.add_argument("audio_path")
+    parser = argparse.ArgumentParser(description="Run a trained model on one or more audio files")
+    parser.add_argument("audio_path", nargs="+", help="audio files, folders, or glob patterns")
     parser.add_argument("--model", default="ml/models/baseline_logreg.joblib")
     parser.add_argument("--config", default="ml/configs/train_config.yaml")
+    parser.add_argument(
+        "--feature-cache",
+        default="ml/data/cache/feats",
+        help="on-disk feature cache for baseline models; empty string disables",
+    )
+    parser.add_argument("--n-jobs", type=int, default=-1, help="parallel featurization workers (-1 = all cores); runs serially below 128 files")
     args = parser.parse_args()
 
+    paths = expand_audio_paths(args.audio_path)
+    if not paths:
+        raise FileNotFoundError(f"No audio files matched: {' '.join(args.audio_path)}")
+
     pack = load_model_pack(args.model)
     cfg = load_effective_config(pack, args.config)
     threshold = decision_threshold_from_pack(pack)
-    p_raw, p = predict_probability(args.audio_path, pack, cfg)
-    pred = int(p >= threshold)
-    print(f"file={args.audio_path}")
-    print(f"piano_probability_raw={p_raw:.4f}")
-    print(f"piano_probability={p:.4f}")
-    print(f"decision_threshold={threshold:.4f}")
-    print(f"prediction={'piano' if pred else 'non_piano'}")
+    n_jobs = args.n_jobs if len(paths) >= PARALLEL_MIN_FILES else 1
+    raw, prob, errors = predict_probabilities(paths, pack, cfg, args.feature_cache, n_jobs=n_jobs)
+    for idx, path in enumerate(paths):
+        if idx:
+            print()
+        print(f"file={path}")
+        if errors[idx]:
+            print(f"error={errors[idx]}")
+            continue
+        pred = int(prob[idx] >= threshold)
+        print(f"piano_probability_raw={raw[idx]:.4f}")
+        print(f"piano_probability={prob[idx]:.4f}")
+        print(f"decision_threshold={threshold:.4f}")
+        print(f"prediction={'piano' if pred else 'non_piano'}")
+    # Per-file errors are printed inline; the exit status still tells callers something failed.
+    if any(errors):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
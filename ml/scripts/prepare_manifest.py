@@ -1,17 +1,23 @@
 import argparse
+import csv
+import os
+import random
+from collections import Counter
 from pathlib import Path
-import pandas as pd
 
-AUDIO_EXTS = {".wav", ".mp3", ".m4a", ".aac", ".wma", ".flac", ".aiff", ".aif"}
+# Tuple so str.endswith can test every suffix in one C call.
+AUDIO_EXTS = (".wav", ".mp3", ".m4a", ".aac", ".wma", ".flac", ".aiff", ".aif")
 
 
 def collect(split_dir: Path, label: int):
     rows = []
     if not split_dir.exists():
         return rows
-    for p in split_dir.rglob("*"):
-        if p.is_file() and p.suffix.lower() in AUDIO_EXTS:
-            rows.append({"path": str(p), "label": label})
+    # os.walk reuses scandir's cached entry types, so files are never stat'ed or wrapped in Path objects.
+    for dirpath, _, filenames in os.walk(split_dir):
+        for fn in filenames:
+            if fn.lower().endswith(AUDIO_EXTS):
+                rows.append({"path": os.path.join(dirpath, fn), "label": label})
     return rows
 
 
@@ -52,18 +58,29 @@ def main():
     if not rows:
         raise RuntimeError("No audio files found under ml/data/raw")
 
-    df = pd.DataFrame(rows).drop_duplicates(subset=["path"])
-    before_exclude = int(len(df))
-    if excluded_paths:
-        df = df[df["path"].map(lambda p: str(Path(p).resolve()) not in excluded_paths)].copy()
-    df = df.sample(frac=1.0, random_state=42).reset_index(drop=True)
+    # First occurrence wins, matching the previous drop_duplicates(keep="first").
+    labels_by_path: dict[str, int] = {}
+    for r in rows:
+        labels_by_path.setdefault(r["path"], r["label"])
+    before_exclude = len(labels_by_path)
+    items = [
+        (p, label)
+        for p, label in labels_by_path.items()
+        if not excluded_paths or str(Path(p).resolve()) not in excluded_paths
+    ]
+    random.Random(42).shuffle(items)
     out = Path(args.out)
     out.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(out, index=False)
+    with out.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "label"])
+        writer.writerows(items)
 
+    counts = Counter(label for _, label in items)
     print(f"manifest: {out}")
-    print(f"excluded_holdout_sources={before_exclude - len(df)}")
-    print(df.label.value_counts().sort_index().rename(index={0: 'non_piano', 1: 'piano_or_mixed'}))
+    print(f"excluded_holdout_sources={before_exclude - len(items)}")
+    print(f"non_piano={counts.get(0, 0)}")
+    print(f"piano_or_mixed={counts.get(1, 0)}")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,11 @@
 import argparse
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
 import json
+import multiprocessing
+import os
+import sys
 import numpy as np
 import pandas as pd
 import yaml
@@ -8,44 +13,253 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import StandardScaler
 import joblib
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
 
 from model_utils import (
+    BASELINE_FEATURE_DIM,
+    FEATURE_VERSION,
     apply_platt,
     build_metrics,
     choose_threshold_for_recall,
-    featurize,
+    feature_cfg_key,
+    featurize_waveform,
+    featurize_waveforms_batch,
     grouped_split_indices,
+    load_audio,
+    load_cached_features,
+    save_cached_features,
     source_group_key,
     stratified_fallback_split,
 )
 
 
+try:
+    import lz4  # noqa: F401
+
+    MODEL_PACK_COMPRESS = ("lz4", 3)
+except ImportError:
+    MODEL_PACK_COMPRESS = ("zlib", 3)
+
+
+def _load_safe(path: str, cfg: dict) -> tuple[np.ndarray | None, str]:
+    try:
+        return load_audio(path, cfg)[0], ""
+    except Exception as ex:
+        return None, str(ex)
+
+
+def _init_feature_worker() -> None:
+    # The pool already runs one process per core; BLAS/OpenMP pools sized to the core count in
+    # each worker would oversubscribe the CPU N-fold (loky workers got this cap for free).
+    threadpool_limits(limits=1)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(1)
+
+
+def _fill_from_cache(
+    paths: list[str], cfg: dict, cache_dir: str, out: np.ndarray, errors: dict[int, str]
+) -> list[int]:
+    # Copies per-file cache hits into `out` and returns the row indices still to featurize.
+    pending = []
+    for i, path in enumerate(paths):
+        cached = None
+        if cache_dir:
+            try:
+                cached = load_cached_features(path, cfg, cache_dir)
+            except OSError as ex:
+                errors[i] = str(ex)
+                continue
+        if cached is not None:
+            out[i] = cached
+        else:
+            pending.append(i)
+    return pending
+
+
+def _save_cached_safe(path: str, cfg: dict, cache_dir: str, feat: np.ndarray) -> None:
+    # A failed cache write only costs a recompute next run, so report it and keep the row.
+    try:
+        save_cached_features(path, cfg, cache_dir, feat)
+    except OSError as ex:
+        print(f"cache write failed {path}: {ex}")
+
+
+def _featurize_pipelined(
+    paths: list[str], cfg: dict, n_jobs: int, cache_dir: str, prefetch: int, out: np.ndarray
+) -> dict[int, str]:
+    # I/O threads decode ahead while a process pool runs the FFT math, so disk latency
+    # overlaps compute and at most 2*prefetch waveforms are held in memory.
+    # Rows are written straight into `out`; failures are returned as {row index: error}.
+    errors: dict[int, str] = {}
+    pending = _fill_from_cache(paths, cfg, cache_dir, out, errors)
+    if not pending:
+        return errors
+
+    workers = n_jobs if n_jobs > 0 else (os.cpu_count() or 1)
+    todo = iter(pending)
+    loading: dict = {}
+    inflight: dict = {}
+
+    def feed() -> None:
+        # Decodes are submitted lazily so no I/O thread ever blocks on a full buffer; a raise in
+        # the loop below only has to wait for the few decodes already running.
+        while len(loading) + len(inflight) < 2 * prefetch:
+            i = next(todo, None)
+            if i is None:
+                return
+            loading[io_pool.submit(load_audio, paths[i], cfg)] = i
+
+    def collect(fut) -> None:
+        i = inflight.pop(fut)
+        try:
+            feat = fut.result()
+        except Exception as ex:
+            errors[i] = str(ex)
+            return
+        out[i] = feat
+        if cache_dir:
+            _save_cached_safe(paths[i], cfg, cache_dir, feat)
+
+    def start(fut) -> None:
+        i = loading.pop(fut)
+        try:
+            wave, sr = fut.result()
+        except Exception as ex:
+            errors[i] = str(ex)
+            return
+        inflight[cpu_pool.submit(featurize_waveform, wave, sr, cfg)] = i
+
+    # Spawn, not fork: forking while the I/O threads hold import/decoder locks deadlocks the workers.
+    spawn = multiprocessing.get_context("spawn")
+    cpu_pool = ProcessPoolExecutor(max_workers=workers, mp_context=spawn, initializer=_init_feature_worker)
+    with cpu_pool, ThreadPoolExecutor(max_workers=min(8, workers)) as io_pool:
+        try:
+            feed()
+            while loading or inflight:
+                for fut in wait([*loading, *inflight], return_when=FIRST_COMPLETED).done:
+                    if fut in inflight:
+                        collect(fut)
+                    else:
+                        start(fut)
+                feed()
+        except BaseException:
+            for fut in [*loading, *inflight]:
+                fut.cancel()
+            raise
+    return errors
+
+
+def _featurize_on_device(
+    paths: list[str], cfg: dict, n_jobs: int, device: str, batch_size: int, cache_dir: str, out: np.ndarray
+) -> dict[int, str]:
+    # Decode one batch at a time on CPU workers, then run the spectral math for the whole batch
+    # on the device, so at most batch_size waveforms are held in memory.
+    errors: dict[int, str] = {}
+    pending = _fill_from_cache(paths, cfg, cache_dir, out, errors)
+    sr = int(cfg["sample_rate"])
+    with Parallel(n_jobs=n_jobs, backend="loky") as parallel:
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start : start + batch_size]
+            loaded = parallel(delayed(_load_safe)(paths[i], cfg) for i in chunk)
+            ok_idx = []
+            for i, (wave, err) in zip(chunk, loaded):
+                if wave is None:
+                    errors[i] = err
+                else:
+                    ok_idx.append(i)
+            if not ok_idx:
+                continue
+            feats = featurize_waveforms_batch([wave for wave, _ in loaded if wave is not None], sr, cfg, device=device)
+            out[ok_idx] = feats
+            if cache_dir:
+                for i, feat in zip(ok_idx, feats):
+                    _save_cached_safe(paths[i], cfg, cache_dir, feat)
+    return errors
+
+
+def _xy_cache_path(manifest: str, paths: list[str], cfg: dict, cache_dir: str) -> Path:
+    # Keyed on the manifest version, the feature config and every clip's (mtime, size), so a clip
+    # re-recorded or replaced in place invalidates the matrix; a stat per row is cheap next to decoding.
+    st = os.stat(manifest)
+    manifest_key = f"{Path(manifest).resolve()}|{st.st_mtime_ns}|{st.st_size}|{feature_cfg_key(cfg)}"
+    key = hashlib.md5(manifest_key.encode("utf-8"))
+    for path in paths:
+        try:
+            st = os.stat(path)
+            key.update(f"\n{path}|{st.st_mtime_ns}|{st.st_size}".encode("utf-8"))
+        except OSError:
+            key.update(f"\n{path}|missing".encode("utf-8"))
+    return Path(cache_dir) / f"{key.hexdigest()[:16]}.npz"
+
+
+def _build_feature_matrix(
+    df: pd.DataFrame, cfg: dict, args: argparse.Namespace
+) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    paths = df["path"].tolist()
+    # One contiguous allocation filled in place; failed rows are masked out afterwards.
+    X = np.empty((len(paths), BASELINE_FEATURE_DIM), dtype=np.float32)
+    if args.device == "cpu":
+        errors = _featurize_pipelined(paths, cfg, args.n_jobs, args.feature_cache, max(1, args.prefetch), X)
+    else:
+        errors = _featurize_on_device(
+            paths, cfg, args.n_jobs, args.device, max(1, args.device_batch_size), args.feature_cache, X
+        )
+
+    ok = np.ones(len(paths), dtype=bool)
+    for i in sorted(errors):
+        print(f"skip {paths[i]}: {errors[i]}")
+        ok[i] = False
+    X = X[ok]
+    y = df["label"].to_numpy(dtype=np.int64)[ok]
+    kept_paths = [p for p, keep in zip(paths, ok) if keep]
+    return X, y, kept_paths
+
+
 def main():
     parser = argparse.ArgumentParser(description="Train baseline piano/non-piano classifier")
     parser.add_argument("--manifest", default="ml/data/labels/manifest.csv")
     parser.add_argument("--config", default="ml/configs/train_config.yaml")
     parser.add_argument("--model-out", default="ml/models/baseline_logreg.joblib")
     parser.add_argument("--report-out", default="ml/reports/baseline_metrics.json")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="parallel featurization workers (-1 = all cores)")
+    parser.add_argument(
+        "--feature-cache",
+        default="ml/data/cache/feats",
+        help="on-disk feature cache keyed by path/mtime/config; empty string disables",
+    )
+    parser.add_argument(
+        "--xy-cache",
+        default="ml/data/cache/xy",
+        help="cache of the full feature matrix keyed by manifest, per-clip mtime/size and config; empty string disables",
+    )
+    parser.add_argument("--prefetch", type=int, default=32, help="max decoded clips queued ahead of feature workers")
+    parser.add_argument(
+        "--device",
+        default="cpu",
+        help="cpu = per-file librosa features; cuda (or any torch device) = batched torch features",
+    )
+    parser.add_argument("--device-batch-size", type=int, default=64, help="clips per batched device featurization call")
     args = parser.parse_args()
 
     cfg = yaml.safe_load(Path(args.config).read_text(encoding="utf-8"))
     df = pd.read_csv(args.manifest)
 
-    X = []
-    y = []
-    groups = []
-    kept_paths = []
-    for row in df.itertuples(index=False):
-        try:
-            X.append(featurize(row.path, cfg))
-            y.append(int(row.label))
-            groups.append(source_group_key(row.path))
-            kept_paths.append(row.path)
-        except Exception as ex:
-            print(f"skip {row.path}: {ex}")
-
-    X = np.vstack(X)
-    y = np.array(y, dtype=np.int64)
+    xy_cache = _xy_cache_path(args.manifest, df["path"].tolist(), cfg, args.xy_cache) if args.xy_cache else None
+    if xy_cache is not None and xy_cache.exists():
+        with np.load(xy_cache, allow_pickle=False) as cached:
+            X, y, kept_paths = cached["X"], cached["y"], cached["paths"].tolist()
+        print(f"features: loaded {len(y)} rows from {xy_cache}")
+    else:
+        X, y, kept_paths = _build_feature_matrix(df, cfg, args)
+        # Skipped rows may be transient (decode or lock failures), so only complete matrices are cached.
+        if xy_cache is not None and len(kept_paths) == len(df):
+            xy_cache.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = xy_cache.with_name(f"{xy_cache.stem}.{os.getpid()}.tmp.npz")
+            np.savez_compressed(tmp_path, X=X, y=y, paths=np.array(kept_paths, dtype=str))
+            os.replace(tmp_path, xy_cache)
+    groups = [source_group_key(p) for p in kept_paths]
 
     unique = np.unique(y)
     if unique.size < 2:
@@ -94,11 +308,14 @@ def main():
     c = cfg["classifier"]["C"]
     max_iter = cfg["classifier"]["max_iter"]
     class_weight = cfg["classifier"]["class_weight"]
+    # With ~a dozen standardized features liblinear converges fastest; saga scales better past a few thousand rows.
+    solver = cfg["classifier"].get("solver") or ("liblinear" if len(y_train) < 5000 else "saga")
+    tol = float(cfg["classifier"].get("tol", 1e-4))
 
     # Standardizing handcrafted features improves optimizer stability for logistic regression.
     model = make_pipeline(
         StandardScaler(),
-        LogisticRegression(C=c, max_iter=max_iter, class_weight=class_weight),
+        LogisticRegression(C=c, max_iter=max_iter, class_weight=class_weight, solver=solver, tol=tol),
     )
     model.fit(X_train, y_train)
 
@@ -151,6 +368,8 @@ def main():
         {
             "model": model,
             "config": cfg,
+            "feature_mode": "baseline_v1",
+            "feature_version": FEATURE_VERSION,
             "decision_threshold": float(decision_threshold),
             "calibration": {
                 "enabled": calibration_enabled,
@@ -164,6 +383,7 @@ def main():
             },
         },
         model_out,
+        compress=MODEL_PACK_COMPRESS,
     )
 
     report_out = Path(args.report_out)